@@ -6,17 +6,23 @@ from __future__ import annotations
 import argparse
 import asyncio
 import enum
+import errno
+import hashlib
+import keyword
 import logging
 import os
 import re
+import shutil
 import sqlite3
+import string
 import subprocess
+import sys
 import tempfile
+import time
 from asyncio import create_subprocess_exec, gather
-from contextlib import asynccontextmanager, contextmanager
-from dataclasses import dataclass
-from functools import partial, wraps
-from io import StringIO
+from contextlib import asynccontextmanager, closing, contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache, partial, wraps
 from pathlib import Path
 from typing import (
     Any,
@@ -24,6 +30,7 @@ from typing import (
     Callable,
     Coroutine,
     Dict,
+    Iterator,
     List,
     Mapping,
     Optional,
@@ -34,7 +41,6 @@ from typing import (
 
 from ruamel.yaml import YAML
 from ruamel.yaml.error import YAMLError, YAMLWarning
-from ruamel.yaml.util import load_yaml_guess_indent
 
 try:
     from rich.console import Console
@@ -61,11 +67,19 @@ logger.addHandler(logging.NullHandler())
 
 T = TypeVar("T")
 
+#: Use slots for dataclasses where supported (python >= 3.10)
+DATACLASS_OPTIONS: Dict[str, Any] = (
+    {"slots": True} if sys.version_info >= (3, 10) else {}
+)
+
 
 class async_cache:
     """
     A wrapper for caching coroutines.
 
+    Concurrent calls with the same arguments share a single pending call.
+    Failed calls aren't cached.
+
     Parameters
     ----------
     cache_dict : dict
@@ -93,14 +107,89 @@ class async_cache:
         async def get(*args, **kwargs):
             key = (args, tuple(map(tuple, kwargs.items())))
             try:
-                return self._dict[key]
+                future = self._dict[key]
             except KeyError:
-                value = await func(*args, **kwargs)
-                self._dict[key] = value
-                return value
+                future = asyncio.ensure_future(func(*args, **kwargs))
+                future.add_done_callback(partial(self._discard_failed, key))
+                self._dict[key] = future
+            # a cancelled caller mustn't cancel the call shared with others
+            return await asyncio.shield(future)
 
         return get
 
+    def _discard_failed(self, key, future: asyncio.Future) -> None:
+        """Remove a call from the cache if it didn't succeed."""
+        if future.cancelled() or future.exception() is not None:
+            if self._dict.get(key) is future:
+                del self._dict[key]
+
+
+# format specs that can be embedded into an f-string safely
+regex_safe_format_spec = r"[\w<>^=+\- #,.%]*"
+pattern_safe_format_spec = re.compile(regex_safe_format_spec)
+
+
+@lru_cache(maxsize=None)
+def compile_template(template: str) -> Callable[..., str]:
+    """
+    Compile a format string into a function.
+
+    The returned function takes the replacement fields as keyword arguments
+    like `str.format` but doesn't parse the format string on every call.
+    Format strings using more than named fields with an optional conversion
+    and format spec fall back to `str.format`.
+    This method is cached so that every template is compiled only once.
+
+    Parameters
+    ----------
+    template : str
+        The format string.
+
+    Returns
+    -------
+    Callable[..., str]
+        A function formatting its keyword arguments according to the template.
+    """
+    try:
+        parsed = list(string.Formatter().parse(template))
+    except ValueError:
+        return template.format
+
+    names: List[str] = []
+    body = []
+    for literal, name, spec, conversion in parsed:
+        body.append(literal.replace("{", "{{").replace("}", "}}"))
+        if name is None:
+            continue
+        if (
+            not name.isidentifier()
+            or keyword.iskeyword(name)
+            or name == "kwargs"
+            or conversion not in (None, "r", "s", "a")
+            or not pattern_safe_format_spec.fullmatch(spec or "")
+        ):
+            return template.format
+        if name not in names:
+            names.append(name)
+        body.append(
+            "{"
+            + name
+            + (f"!{conversion}" if conversion else "")
+            + (f":{spec}" if spec else "")
+            + "}"
+        )
+
+    source = "def render(**kwargs):\n"
+    source += "".join(f"    {name} = kwargs[{name!r}]\n" for name in names)
+    source += f"    return f{''.join(body)!r}\n"
+
+    namespace: Dict[str, Any] = {}
+    try:
+        exec(source, namespace)
+    except SyntaxError:
+        return template.format
+    return namespace["render"]
+
 
 # -- Git ---------------------------------------------------------------------
 
@@ -123,6 +212,8 @@ def no_git_env(_env: Mapping[str, str] | None = None) -> dict[str, str]:
     You can pass `os.environ` to this method and then pass its return value
     to `subprocess.run` as a environment.
 
+    The result for `os.environ` is computed once and reused.
+
     Parameters
     ----------
     _env : Mapping[str, str] | None, optional
@@ -141,7 +232,8 @@ def no_git_env(_env: Mapping[str, str] | None = None) -> dict[str, str]:
     # while running pre-commit hooks in submodules.
     # GIT_DIR: Causes git clone to clone wrong thing
     # GIT_INDEX_FILE: Causes 'error invalid object ...' during commit
-    _env = _env if _env is not None else os.environ
+    if _env is None:
+        return _no_git_os_environ()
     return {
         k: v
         for k, v in _env.items()
@@ -162,6 +254,12 @@ def no_git_env(_env: Mapping[str, str] | None = None) -> dict[str, str]:
     }
 
 
+@lru_cache(maxsize=None)
+def _no_git_os_environ() -> dict[str, str]:
+    """Clear problematic git env vars from `os.environ`."""
+    return no_git_env(os.environ)
+
+
 async def cmd_output(
     *cmd: str,
     check: bool = True,
@@ -189,7 +287,9 @@ async def cmd_output(
     subprocess.CalledProcessError
         The command failed.
     """
-    for arg in ("stdin", "stdout", "stderr"):
+    # nothing is ever written to stdin so don't create a pipe for it
+    kwargs.setdefault("stdin", subprocess.DEVNULL)
+    for arg in ("stdout", "stderr"):
         kwargs.setdefault(arg, subprocess.PIPE)
 
     proc = await create_subprocess_exec(*cmd, **kwargs)
@@ -207,33 +307,87 @@ async def cmd_output(
     return returncode, stdout, stderr
 
 
-async def init_repo(path: str, remote: str) -> None:
+if sys.platform == "win32":  # pragma: no cover (windows)
+    import msvcrt
+
+    # on windows we lock "regions" of files, we don't care about the actual
+    # byte region so we'll just pick *some* number here.
+    _region = 0xFFFF
+
+    def _lock(fileno: int) -> None:
+        while True:
+            try:
+                msvcrt.locking(fileno, msvcrt.LK_LOCK, _region)
+            except OSError as e:
+                # Locking violation. Returned when the _LK_LOCK or _LK_RLCK
+                # flag is specified and the file cannot be locked after 10
+                # attempts.
+                if e.errno != errno.EDEADLOCK:
+                    raise
+            else:
+                break
+
+    def _unlock(fileno: int) -> None:
+        msvcrt.locking(fileno, msvcrt.LK_UNLCK, _region)
+
+else:  # pragma: win32 no cover
+    import fcntl
+
+    def _lock(fileno: int) -> None:
+        fcntl.flock(fileno, fcntl.LOCK_EX)
+
+    def _unlock(fileno: int) -> None:
+        fcntl.flock(fileno, fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def file_lock(path: Path) -> AsyncGenerator[None, Any]:
     """
-    Create a minimal repository with a given remote.
+    Acquire an exclusive lock on a file.
+
+    Waiting for the lock happens in a separate thread so that the event loop
+    isn't blocked.
 
     Parameters
     ----------
-    path : str
-        The location of the repo to create.
-    remote : str
-        The url to add as `origin` remote.
+    path : Path
+        The file to lock. It is created if it doesn't exist.
     """
-    if os.path.isdir(remote):
-        remote = os.path.abspath(remote)
+    with open(path, "a+") as f:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _lock, f.fileno())
+        try:
+            yield
+        finally:
+            _unlock(f.fileno())
 
-    git = ("git", *NO_FS_MONITOR)
-    env = no_git_env()
-    # avoid the user's template so that hooks do not recurse
-    await cmd_output(*git, "init", "--template=", path, env=env)
-    await cmd_output(*git, "remote", "add", "origin", remote, cwd=path, env=env)
+
+#: Maximum size in bytes of the repositories kept in the cache
+MAX_CACHE_SIZE = 256 * 1024 * 1024
+
+
+def get_cache_dir() -> Path:
+    """
+    Determine the directory repositories are cached in.
+
+    Returns
+    -------
+    Path
+        The cache directory (which might not exist yet).
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return Path(cache_home) / "check-pre-commit-config-frozen"
 
 
 @asynccontextmanager
-async def tmp_repo(repo: str) -> AsyncGenerator[Path, Any]:
+async def cached_repo(repo: str) -> AsyncGenerator[Path, Any]:
     """
-    Clone a repo to a temporary directory.
+    Clone a repo to the cache directory.
 
-    This method returns a contextmanager that removes the repository on exit.
+    The repository is a bare partial clone that doesn't contain any trees or
+    blobs. It is kept after use so that subsequent fetches only need
+    to download objects that aren't present yet. This method returns a
+    contextmanager that holds a lock on the repository until exit.
 
     Parameters
     ----------
@@ -245,86 +399,247 @@ async def tmp_repo(repo: str) -> AsyncGenerator[Path, Any]:
     AsyncContextManager[Path]
         A contextmanager that returns a path to the cloned directory.
     """
-    with tempfile.TemporaryDirectory() as tmp:
-        _git = ("git", *NO_FS_MONITOR, "-C", tmp)
-        # init repo
-        await init_repo(tmp, repo)
-        await cmd_output(*_git, "config", "extensions.partialClone", "true")
-        await cmd_output(*_git, "config", "fetch.recurseSubmodules", "false")
+    if os.path.isdir(repo):
+        repo = os.path.abspath(repo)
+
+    cache_dir = get_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / hashlib.sha1(repo.encode()).hexdigest()
+
+    async with file_lock(path.with_suffix(".lock")):
+        if not path.is_dir():
+            # clone next to the final location and move the clone there once
+            # complete so that an interrupted clone is never used
+            tmp_path = tempfile.mkdtemp(prefix=f"{path.name}.", dir=cache_dir)
+            try:
+                # avoid the user's template so that hooks do not recurse
+                # tags and other branches are fetched later when needed
+                await cmd_output(
+                    "git",
+                    *NO_FS_MONITOR,
+                    "clone",
+                    "--bare",
+                    "--filter=tree:0",
+                    "--single-branch",
+                    "--no-tags",
+                    "--quiet",
+                    "--template=",
+                    "--config=fetch.recurseSubmodules=false",
+                    # the url is never an option
+                    "--",
+                    repo,
+                    tmp_path,
+                    env=no_git_env(),
+                )
+                os.replace(tmp_path, path)
+            except BaseException:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                raise
 
-        yield Path(tmp)
+        # mark as recently used
+        os.utime(path)
 
+        yield path
 
-@async_cache()
-async def get_tags(repo_url: str, hash: str) -> List[str]:
+
+def get_size(path: Path) -> int:
     """
-    Retrieve a list of tags for a given commit.
+    Determine the size of the files in a directory.
 
-    This method is cached for the same combination of repo and hash.
+    Files that are removed while walking the directory
+    (e.g. by a concurrent fetch) are skipped.
 
     Parameters
     ----------
-    repo_url : str
-        The URL of the repo the commit is in.
-    hash : str
-        A valid git commit reference.
+    path : Path
+        The directory.
 
     Returns
     -------
-    List[str]
-        A list of tags for referencing the given commit.
+    int
+        The size in bytes.
     """
-    async with tmp_repo(repo_url) as repo_path:
-        return await get_tags_in_repo(repo_path, hash)
+    size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return size
 
 
-@async_cache()
-async def get_tags_in_repo(repo_path: str, hash: str, fetch: bool = True) -> List[str]:
+def prune_cache(max_size: int = MAX_CACHE_SIZE) -> None:
     """
-    Retrieve a list of tags for a given commit.
+    Remove the least recently used repositories from the cache.
 
-    This method is cached for the same combination of repo and hash.
+    Repositories are removed until the cache doesn't exceed the given size.
+    Leftovers of interrupted clones are always removed.
 
     Parameters
     ----------
-    repo_path : str
-        The path to the cloned repo.
+    max_size : int, optional
+        The maximum size of the cache in bytes, by default MAX_CACHE_SIZE
+    """
+    cache_dir = get_cache_dir()
+    if not cache_dir.is_dir():
+        return
+
+    repos = []
+    for path in cache_dir.iterdir():
+        try:
+            if path.is_dir():
+                repos.append((path.stat().st_mtime, path))
+        except OSError:
+            # removed concurrently
+            continue
+    repos.sort(reverse=True)
+
+    total_size = 0
+    for _, path in repos:
+        # temporary clones are named `<repo>.<random>`
+        leftover = bool(path.suffix)
+        if not leftover:
+            total_size += get_size(path)
+        if leftover or total_size > max_size:
+            logger.debug(f"Removing {path} from cache.")
+            with open(path.with_suffix(".lock"), "a+") as f:
+                _lock(f.fileno())
+                try:
+                    shutil.rmtree(path, ignore_errors=True)
+                finally:
+                    _unlock(f.fileno())
+
+
+#: Maximum number of commits whose tags are kept in the tag cache
+MAX_TAG_CACHE_ENTRIES = 1000
+
+#: Seconds after which the cached tags of a commit are retrieved again
+TAG_CACHE_EXPIRY = 24 * 60 * 60
+
+
+@contextmanager
+def tag_cache() -> Iterator[Optional[sqlite3.Connection]]:
+    """
+    Connect to the database caching the tags of commits.
+
+    The connection is meant to be used for a whole run.
+
+    Returns
+    -------
+    ContextManager[Optional[sqlite3.Connection]]
+        A contextmanager that returns the connection and closes it on exit.
+        It returns None if the database can't be opened.
+    """
+    try:
+        cache_dir = get_cache_dir()
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        db = sqlite3.connect(str(cache_dir / "tags.db"))
+    except (sqlite3.Error, sqlite3.Warning, OSError):
+        logger.exception("Couldn't open tag cache.")
+        yield None
+        return
+
+    with closing(db):
+        try:
+            with db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS tags ("
+                    "   repo TEXT NOT NULL,"
+                    "   hash TEXT NOT NULL,"
+                    "   tags TEXT NOT NULL,"
+                    "   fetched REAL NOT NULL,"
+                    "   used REAL NOT NULL,"
+                    "   PRIMARY KEY (repo, hash)"
+                    ")"
+                )
+        except (sqlite3.Error, sqlite3.Warning):
+            logger.exception("Couldn't open tag cache.")
+            yield None
+        else:
+            yield db
+
+
+def get_cached_tags(
+    db: sqlite3.Connection, repo_url: str, hash: str
+) -> Optional[List[str]]:
+    """
+    Look up the tags of a commit in the tag cache.
+
+    Parameters
+    ----------
+    db : sqlite3.Connection
+        The connection to the tag cache.
+    repo_url : str
+        The URL of the repo the commit is in.
     hash : str
-        A valid git commit reference.
-    fetch : bool, optional
-        Download the revision with git fetch first, by default True
+        The full hex object name of the commit.
 
     Returns
     -------
-    List[str]
-        A list of tags for referencing the given commit.
+    Optional[List[str]]
+        The tags if cached and not expired else None
     """
-    _git = ("git", *NO_FS_MONITOR, "-C", repo_path)
+    now = time.time()
+    with db:
+        result = db.execute(
+            "SELECT tags FROM tags WHERE repo = ? AND hash = ? AND fetched > ?",
+            (repo_url, hash, now - TAG_CACHE_EXPIRY),
+        ).fetchone()
+        if not result:
+            return None
 
-    if fetch:
-        # download rev
-        # The --filter options makes use of git's partial clone feature.
-        # It only fetches the commit history but not the commit contents.
-        # Still it fetches all commits reachable from the given commit which is way more than we need
-        await cmd_output(*_git, "config", "extensions.partialClone", "true")
-        await cmd_output(
-            *_git, "fetch", "origin", hash, "--quiet", "--filter=tree:0", "--tags"
+        db.execute(
+            "UPDATE tags SET used = ? WHERE repo = ? AND hash = ?",
+            (now, repo_url, hash),
         )
+        # tag names cannot contain newlines
+        return result[0].split("\n") if result[0] else []
 
-    # determine closest tag
-    closest_tag = (await cmd_output(*_git, "describe", hash, "--abbrev=0", "--tags"))[1]
-    closest_tag = closest_tag.strip()
 
-    # determine tags
-    out = (await cmd_output(*_git, "tag", "--points-at", f"refs/tags/{closest_tag}"))[1]
-    return out.splitlines()
+def cache_tags(
+    db: sqlite3.Connection, repo_url: str, hash: str, tags: List[str]
+) -> None:
+    """
+    Store the tags of a commit in the tag cache.
+
+    The least recently used entries are removed so that the cache
+    doesn't exceed `MAX_TAG_CACHE_ENTRIES`.
+
+    Parameters
+    ----------
+    db : sqlite3.Connection
+        The connection to the tag cache.
+    repo_url : str
+        The URL of the repo the commit is in.
+    hash : str
+        The full hex object name of the commit.
+    tags : List[str]
+        The tags referencing the commit.
+    """
+    now = time.time()
+    with db:
+        db.execute(
+            "INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?, ?)",
+            (repo_url, hash, "\n".join(tags), now, now),
+        )
+        db.execute(
+            "DELETE FROM tags WHERE rowid NOT IN "
+            "(SELECT rowid FROM tags ORDER BY used DESC LIMIT ?)",
+            (MAX_TAG_CACHE_ENTRIES,),
+        )
 
 
 @async_cache()
-async def get_hash(repo_url: str, rev: str) -> str:
+async def fetch_info(
+    repo_url: str, rev: str, tags: bool = True
+) -> Tuple[str, List[str]]:
     """
-    Retrieve the hash for a given tag.
+    Retrieve the hash and the tags for a given revision.
 
+    Both are determined in a single session in the cached clone so that
+    the repository only needs to be fetched once.
     This method is cached for the same combination of repo and rev.
 
     Parameters
@@ -333,20 +648,25 @@ async def get_hash(repo_url: str, rev: str) -> str:
         The URL of the repo the commit is in.
     rev : str
         A valid git commit reference.
+    tags : bool, optional
+        Fetch and determine the tags, by default True
 
     Returns
     -------
-    str
-        The hex object name (hash) referenced.
+    Tuple[str, List[str]]
+        The hex object name (hash) referenced and
+        a list of tags for referencing the given commit (empty if not requested).
     """
-    async with tmp_repo(repo_url) as repo_path:
-        return await get_hash_in_repo(repo_path, rev)
+    async with cached_repo(repo_url) as repo_path:
+        return await fetch_info_in_repo(str(repo_path), rev, tags=tags)
 
 
 @async_cache()
-async def get_hash_in_repo(repo_path: str, rev: str, fetch=True) -> str:
+async def fetch_info_in_repo(
+    repo_path: str, rev: str, fetch: bool = True, tags: bool = True
+) -> Tuple[str, List[str]]:
     """
-    Retrieve the hash for a given tag.
+    Retrieve the hash and the tags for a given revision.
 
     This method is cached for the same combination of repo and rev.
 
@@ -357,27 +677,63 @@ async def get_hash_in_repo(repo_path: str, rev: str, fetch=True) -> str:
     rev : str
         A valid git commit reference.
     fetch : bool, optional
-        Download the commit for the given reference first, by default True
+        Download the revision with git fetch first, by default True
+    tags : bool, optional
+        Fetch and determine the tags, by default True
 
     Returns
     -------
-    str
-        The hex object name (hash) referenced.
+    Tuple[str, List[str]]
+        The hex object name (hash) referenced and
+        a list of tags for referencing the given commit (empty if not requested).
     """
     _git = ("git", *NO_FS_MONITOR, "-C", repo_path)
+    env = no_git_env()
+
     if fetch:
-        await cmd_output(*_git, "config", "extensions.partialClone", "true")
+        # download rev
+        # The --filter options makes use of git's partial clone feature.
+        # It only fetches the commit history but not the commit contents.
+        # Still it fetches all commits reachable from the given commit which is way more than we need
+        # Only fetch all tags of the remote if they are needed
         await cmd_output(
             *_git,
             "fetch",
-            "origin",
-            rev,
             "--quiet",
-            "--depth=1",
             "--filter=tree:0",
-            "--tags",
+            *(("--tags",) if tags else ()),
+            # the rev is never an option
+            "--",
+            "origin",
+            rev,
+            env=env,
         )
-    return (await cmd_output(*_git, "rev-parse", rev))[1].strip()
+
+    # a fetched tag or branch isn't necessarily available under its name
+    ref = "FETCH_HEAD" if fetch else rev
+    hash = (await cmd_output(*_git, "rev-parse", ref, env=env))[1].strip()
+    if not tags:
+        return hash, []
+
+    # determine tags of the commit itself
+    commit = f"{ref}^{{commit}}"
+    out = (await cmd_output(*_git, "tag", "--points-at", commit, env=env))[1]
+    if out:
+        return hash, out.splitlines()
+
+    # otherwise determine closest tag
+    returncode, closest_tag, _ = await cmd_output(
+        *_git, "describe", ref, "--abbrev=0", "--tags", check=False, env=env
+    )
+    if returncode:
+        logger.debug(f"No tag found for {rev}")
+        return hash, []
+    closest_tag = closest_tag.strip()
+
+    # determine tags of the commit with the closest tag
+    commit = f"refs/tags/{closest_tag}^{{commit}}"
+    out = (await cmd_output(*_git, "tag", "--points-at", commit, env=env))[1]
+    return hash, out.splitlines()
 
 
 # -- Pre-commit --------------------------------------------------------------
@@ -428,8 +784,7 @@ SHA1_LENGTH = 160
 MIN_HASH_LENGTH = 7
 
 # hex object names can also be abbreviated
-regex_abbrev_hash = r"[\dabcdef]+"
-pattern_abbrev_hash = re.compile(regex_abbrev_hash)
+HEX_DIGITS = b"0123456789abcdefABCDEF"
 
 
 def is_hash(rev: str) -> bool:
@@ -451,7 +806,8 @@ def is_hash(rev: str) -> bool:
     bool
         Whether the given revision can be considered frozen.
     """
-    return bool(pattern_abbrev_hash.fullmatch(rev.lower()))
+    # deleting all hex digits must leave nothing
+    return bool(rev) and rev.isascii() and not rev.encode().translate(None, HEX_DIGITS)
 
 
 # A version can be frozen to every valid tag name or even any revision identifier
@@ -461,6 +817,7 @@ regex_frozen_comment = r"# frozen: (?P<rev>\S+)(?P<note> .*)?"
 pattern_frozen_comment = re.compile(regex_frozen_comment)
 
 comment_template = "frozen: {rev}{note}"
+format_comment = compile_template(comment_template)
 
 
 def process_frozen_comment(comment: str) -> Tuple[Optional[str], Optional[str]]:
@@ -477,6 +834,9 @@ def process_frozen_comment(comment: str) -> Tuple[Optional[str], Optional[str]]:
     Optional[Tuple[str, str]]
         the revision and the arbitrary comment else None
     """
+    if not comment.startswith("# frozen: "):
+        return None, comment
+
     match = pattern_frozen_comment.fullmatch(comment)
     if not match:
         return None, comment
@@ -495,6 +855,8 @@ class Rule(enum.Enum):
         The one letter code assigned to the rule. (Must be unique)
     template : str
         A message template for complains derived from this rule
+    format_message : Callable[..., str]
+        The compiled template formatting its keyword arguments
     """
 
     #: Issued when parsing a file fails and the file therefore doesn't contain valid yaml.
@@ -531,13 +893,18 @@ class Rule(enum.Enum):
         obj._value_ = code
         obj.code = code  # type: ignore
         obj.template = template  # type: ignore
+        # parse the template once instead of for every complain
+        obj.format_message = compile_template(template)  # type: ignore
         return obj
 
 
 EXCLUSIVE_RULES = [(Rule.FORCE_FREEZE, Rule.FORCE_UNFREEZE)]
 
+#: Maximum number of repositories that are fetched in parallel
+MAX_PARALLEL_FETCHES = 16
 
-@dataclass()
+
+@dataclass(**DATACLASS_OPTIONS)
 class Complaint:
     """A complain derived from a rule."""
 
@@ -550,21 +917,223 @@ class Complaint:
     fixed: bool = False
 
 
+# line breaks as recognized by the yaml parser when counting lines
+regex_line_break = r"(?<=[\n\x85\u2028\u2029])|(?<=\r)(?!\n)"
+pattern_line_break = re.compile(regex_line_break)
+
+regex_quoted_scalar = r"\"(?:[^\"\\]|\\.)*\"|'(?:[^']|'')*'"
+pattern_quoted_scalar = re.compile(regex_quoted_scalar)
+
+# anchors and tags preceding a value
+regex_node_properties = r"(?:[&!]\S*[ \t]+)*"
+pattern_node_properties = re.compile(regex_node_properties)
+
+
+@dataclass(**DATACLASS_OPTIONS)
+class RevFix:
+    """
+    A change to the value of a `rev` key and its comment.
+
+    Attributes
+    ----------
+    line : int
+        The line of the value. (starting with 0)
+    column : int
+        The column of the value. (starting with 0)
+    rev : str
+        The value as parsed from the file.
+    new_rev : Optional[str]
+        The value to replace the current one with, by default None (keep)
+    comment : Optional[str]
+        The comment to replace the current one with, by default None (keep).
+        An empty string removes the comment.
+    comment_line : Optional[int]
+        The line the current comment starts in, by default None (no comment)
+    comment_column : Optional[int]
+        The column the current comment starts in, by default None (no comment)
+    comment_end_line : Optional[int]
+        The last line of the current comment, by default None (no comment)
+    complaints : List[Complaint]
+        The complaints fixed by this change.
+    """
+
+    line: int
+    column: int
+    rev: str
+    new_rev: Optional[str] = None
+    comment: Optional[str] = None
+    comment_line: Optional[int] = None
+    comment_column: Optional[int] = None
+    comment_end_line: Optional[int] = None
+    complaints: List[Complaint] = field(default_factory=list)
+
+    def apply(self, lines: List[str]) -> bool:
+        """
+        Apply the change to the lines of a file.
+
+        Lines that are removed are replaced by empty strings so that
+        the line numbers of other changes stay valid.
+
+        Parameters
+        ----------
+        lines : List[str]
+            The lines of the file including their line breaks.
+
+        Returns
+        -------
+        bool
+            Whether the change was applied. It fails if the value couldn't
+            be located or a comment can't be attached to it.
+        """
+        line = lines[self.line]
+        text = line.rstrip("\r\n\x85\u2028\u2029")
+        eol = line[len(text) :]
+
+        # determine the extent of the current value
+        match = pattern_node_properties.match(text, self.column)
+        start = match.end() if match else self.column
+        quote = text[start : start + 1]
+        if quote in ("'", '"'):
+            quoted = pattern_quoted_scalar.match(text, start)
+            if not quoted:
+                return False
+            end = quoted.end()
+        elif text.startswith(self.rev, start):
+            quote = ""
+            end = start + len(self.rev)
+        else:
+            return False
+
+        value = text[start:end]
+        if self.new_rev is not None:
+            new_rev = self.new_rev
+            if quote == "'":
+                new_rev = new_rev.replace("'", "''")
+            elif quote == '"':
+                new_rev = new_rev.replace("\\", "\\\\").replace('"', '\\"')
+            value = quote + new_rev + quote
+
+        rest, space = text[end:], ""
+        if self.comment is not None:
+            first = self.comment_line
+            if first == self.line:
+                # split off the current comment
+                rest = text[end : self.comment_column]
+                space = rest[len(rest.rstrip(" \t")) :]
+                rest = rest[: len(rest) - len(space)]
+                first += 1
+
+            if self.comment and rest.strip():
+                # a comment following e.g. the rest of a flow mapping
+                # wouldn't belong to the value
+                return False
+
+            if first is not None and self.comment_end_line is not None:
+                # remove the current comment
+                for i in range(first, self.comment_end_line + 1):
+                    lines[i] = ""
+
+            comment = self.comment
+            if comment:
+                if not comment.startswith("#"):
+                    comment = (
+                        "#" + comment if comment.startswith(" ") else "# " + comment
+                    )
+                rest += (space or "  ") + comment
+
+        lines[self.line] = text[:start] + value + rest + eol
+        return True
+
+
+def apply_fixes(content: str, fixes: List[RevFix]) -> str:
+    """
+    Apply changes to the lines of a file.
+
+    Everything except the changed values and comments is preserved.
+    The complaints of changes that cannot be applied are marked as not fixable.
+
+    Parameters
+    ----------
+    content : str
+        The file contents.
+    fixes : List[RevFix]
+        The changes to apply.
+
+    Returns
+    -------
+    str
+        The changed file contents.
+    """
+    lines = pattern_line_break.split(content)
+    # apply changes from right to left so that the columns stay valid
+    for fix in sorted(fixes, key=lambda f: (f.line, f.column), reverse=True):
+        if not fix.apply(lines):
+            logger.warning(f"Couldn't fix rev {fix.rev} in line {fix.line + 1}")
+            for comp in fix.complaints:
+                comp.fixed = False
+                comp.fixable = False
+    return "".join(lines)
+
+
+def select_best_tag(tags: List[str]) -> Optional[str]:
+    """
+    Select the best tag describing a revision.
+
+    Parameters
+    ----------
+    tags : List[str]
+        The tags referencing the revision.
+
+    Returns
+    -------
+    Optional[str]
+        The tag if any are given else None
+    """
+    # prefer the shortest tag containing a dot (likely a version)
+    # falling back to the shortest tag
+    best_dot: Optional[str] = None
+    best_any: Optional[str] = None
+    for tag in tags:
+        if best_any is None or len(tag) < len(best_any):
+            best_any = tag
+        if "." in tag and (best_dot is None or len(tag) < len(best_dot)):
+            best_dot = tag
+
+    best = best_dot or best_any
+    logger.debug(f"Selected {best}")
+    return best
+
+
 class Linter:
     """Lint files and issue complains."""
 
-    def __init__(self, rules: set[str], fix: set[str]) -> None:
+    def __init__(
+        self,
+        rules: set[str],
+        fix: set[str],
+        tag_cache: Optional[sqlite3.Connection] = None,
+    ) -> None:
         """Init."""
         self.rules = rules
         self.fix = fix
+        self.tag_cache = tag_cache
         self._complains: Dict[str, List[Complaint]] = {}
+        self._fixes: Dict[str, List[RevFix]] = {}
         self._current_file: Optional[str] = None
         self._current_complains: Optional[List[Complaint]] = None
+        self._fetch_jobs: Optional[asyncio.Semaphore] = None
 
-    @classmethod
-    async def get_tags(cls, repo_url: str, rev: str) -> List[str]:
+        # cache per linter so that a repo and rev used multiple times
+        # across all linted files is only looked up once
+        self.get_info = async_cache()(self._lookup_info)
+
+    async def _lookup_info(
+        self, repo_url: str, rev: str, tags: bool = True
+    ) -> Optional[Tuple[str, List[str]]]:
         """
-        Retrieve a list of tags for a given commit.
+        Retrieve the hash and the tags for a given revision.
+
+        This method is cached per linter as `get_info`.
 
         Parameters
         ----------
@@ -572,70 +1141,106 @@ class Linter:
             The URL of the repo the commit is in.
         rev : str
             A valid git commit reference.
+        tags : bool, optional
+            Retrieve the tags, by default True.
+            Otherwise the list of tags is empty.
 
         Returns
         -------
-        List[str]
-            A list of tags for referencing the given commit.
+        Optional[Tuple[str, List[str]]]
+            The hash and the list of tags for the given commit if retrieved else None
         """
-        logger.debug(f"Retrieving tags for {repo_url}@{rev}")
-        tags = None
+        if self.tag_cache is not None and len(rev) == SHA1_LENGTH / 4 and is_hash(rev):
+            # the tags of a commit rarely change
+            try:
+                cached_tags = get_cached_tags(self.tag_cache, repo_url, rev.lower())
+            except (sqlite3.Error, sqlite3.Warning):
+                logger.exception("Couldn't use tag cache.")
+            else:
+                if cached_tags is not None:
+                    logger.debug(f"Found {cached_tags} in tag cache.")
+                    return rev.lower(), cached_tags
+
+        if self._fetch_jobs is None:
+            self._fetch_jobs = asyncio.Semaphore(MAX_PARALLEL_FETCHES)
+
+        async with self._fetch_jobs:
+            info = await self._get_info(repo_url, rev, tags)
 
+        if self.tag_cache is not None and info and tags:
+            try:
+                cache_tags(self.tag_cache, repo_url, *info)
+            except (sqlite3.Error, sqlite3.Warning):
+                logger.exception("Couldn't update tag cache.")
+        return info
+
+    async def _get_info(
+        self, repo_url: str, rev: str, tags: bool
+    ) -> Optional[Tuple[str, List[str]]]:
+        """Retrieve the hash and the tags for a given revision."""
+        logger.debug(f"Retrieving info for {repo_url}@{rev}")
         try:
             cached_repo = get_pre_commit_cache(repo_url, rev)
             if cached_repo:
                 logger.info(f"Found repo cached by pre-commit at {cached_repo}")
-                tags = await get_tags_in_repo(cached_repo, rev)
+                if not tags:
+                    try:
+                        # the commit is likely present already
+                        return await fetch_info_in_repo(
+                            cached_repo, rev, fetch=False, tags=False
+                        )
+                    except subprocess.CalledProcessError:
+                        logger.debug("Fetching rev to pre-commit cache.")
+                # unlike our own clones pre-commit's aren't partial clones
+                await cmd_output(
+                    "git",
+                    *NO_FS_MONITOR,
+                    "-C",
+                    cached_repo,
+                    "config",
+                    "extensions.partialClone",
+                    "origin",
+                    env=no_git_env(),
+                )
+                return await fetch_info_in_repo(cached_repo, rev, tags=tags)
             else:
                 logger.info("Couldn't find cached repo in pre-commit cache.")
         except (sqlite3.Error, sqlite3.Warning, subprocess.CalledProcessError):
             logger.exception("Couldn't use pre-commit cache.")
 
-        if tags is None:
-            logger.debug("Checking out repo.")
-            try:
-                tags = await get_tags(repo_url, rev)
-            except subprocess.CalledProcessError:
-                logger.exception("Couldn't retrieve tags.")
+        logger.debug("Checking out repo.")
+        try:
+            info = await fetch_info(repo_url, rev, tags=tags)
+        except subprocess.CalledProcessError:
+            logger.exception("Couldn't retrieve info.")
+            return None
 
-        logger.debug(f"Retrieved {tags}")
-        return tags or []
+        logger.debug(f"Retrieved {info}")
+        return info
 
-    @classmethod
-    async def select_best_tag(cls, repo_url: str, rev: str) -> Optional[str]:
+    async def get_tags(self, repo_url: str, rev: str) -> List[str]:
         """
-        Select the best tag describing a revision.
+        Retrieve a list of tags for a given commit.
 
         Parameters
         ----------
         repo_url : str
-            The repo url.
+            The URL of the repo the commit is in.
         rev : str
-            The commit to select a tag for.
+            A valid git commit reference.
 
         Returns
         -------
-        Optional[str]
-            The tag if any are found else None
+        List[str]
+            A list of tags for referencing the given commit.
         """
-        tags = await cls.get_tags(repo_url, rev)
-        tag = min(
-            filter(lambda s: "." in s, tags),
-            key=len,
-            default=None,
-        ) or min(
-            tags, key=len, default=None  # type: ignore[arg-type]
-        )
-        logger.debug(f"Selected {tag}")
-        return tag
+        info = await self.get_info(repo_url, rev)
+        return info[1] if info else []
 
-    @classmethod
-    async def get_hash_for(cls, repo_url: str, rev: str) -> Optional[str]:
+    async def get_hash_for(self, repo_url: str, rev: str) -> Optional[str]:
         """
         Retrieve the hash for a given tag.
 
-        This method is cached for the same combination of repo and rev.
-
         Parameters
         ----------
         repo_url : str
@@ -645,30 +1250,11 @@ class Linter:
 
         Returns
         -------
-        str
-            The hex object name (hash) referenced.
+        Optional[str]
+            The hex object name (hash) referenced if retrieved else None
         """
-        logger.debug(f"Retrieving hash for {repo_url}@{rev}")
-        try:
-            cached_repo = get_pre_commit_cache(repo_url, rev)
-            if cached_repo:
-                logger.info(f"Found repo cached by pre-commit at {cached_repo}")
-                try:
-                    return await get_hash_in_repo(cached_repo, rev, fetch=False)
-                except subprocess.CalledProcessError:
-                    logger.debug("Fetching tags to pre-commit cache.")
-                    return await get_hash_in_repo(cached_repo, rev, fetch=True)
-            else:
-                logger.info("Couldn't find cached repo in pre-commit cache.")
-        except (sqlite3.Error, sqlite3.Warning, subprocess.CalledProcessError):
-            logger.exception("Couldn't use pre-commit cache.")
-
-        try:
-            return await get_hash(repo_url, rev)
-        except subprocess.CalledProcessError:
-            logger.exception("Couldn't retrieve hash.")
-
-        return None
+        info = await self.get_info(repo_url, rev, tags=False)
+        return info[0] if info else None
 
     def enabled(self, complain_or_rule):
         """Whether a complain or rule is enabled."""
@@ -689,7 +1275,7 @@ class Linter:
         self, file: str, type_: Rule, line: int, column: int, fixable: bool, **kwargs
     ):
         """Issue a complaint."""
-        msg = type_.template.format(**kwargs)  # type: ignore
+        msg = type_.format_message(**kwargs)  # type: ignore[attr-defined]
         c = Complaint(file, line, column, type_, msg, fixable)
 
         logger.debug(f"Issued {c}")
@@ -762,6 +1348,7 @@ class Linter:
         repo_url = repo_yaml["repo"]
         rev = repo_yaml["rev"]
         line, column = repo_yaml.lc.value("rev")
+        fix = RevFix(line, column, rev)
 
         # parse comment
         comment_rev, comment_note = None, ""
@@ -775,6 +1362,21 @@ class Linter:
                 f"Split comment '{comment_str}' into "
                 f"rev={comment_rev!r} note={comment_note!r}"
             )
+
+            # the comment might start in one of the following lines
+            # (the start mark isn't reliable for those)
+            prefix, _, comment_text = comment_yaml.value.partition("#")
+            prefix_lines = pattern_line_break.split(prefix)
+            if len(prefix_lines) > 1:
+                fix.comment_line = line + len(prefix_lines) - 1
+                fix.comment_column = len(prefix_lines[-1])
+            else:
+                fix.comment_line = comment_yaml.start_mark.line
+                fix.comment_column = comment_yaml.start_mark.column
+            # the comment ends with its last non blank line
+            fix.comment_end_line = fix.comment_line + len(
+                pattern_line_break.findall(comment_text.rstrip())
+            )
         comment_note = comment_note or ""
 
         # check rev
@@ -785,18 +1387,29 @@ class Linter:
         if is_short_hash:
             complain(Rule.NO_ABBREV, line, column, False, rev=rev)
 
+        # determine tags attached to closest commit with a tag
+        # need full_hash to identify commit
+        tags: List[str] = []
+        if is_full_hash and (
+            self.should_fix(Rule.FORCE_UNFREEZE)
+            or (comment_rev is None and self.should_fix(Rule.MISSING_FROZEN_COMMENT))
+            or (comment_rev is not None and self.enabled(Rule.CHECK_COMMENTED_TAG))
+        ):
+            tags = await self.get_tags(repo_url, rev)
+
         if is_short_hash or is_full_hash:
             # frozen hash
             comp = complain(Rule.FORCE_UNFREEZE, line, column, is_full_hash, rev=rev)
 
             if self.should_fix(comp):
                 # select best tag
-                tag = await self.select_best_tag(repo_url, rev)
+                tag = select_best_tag(tags)
 
                 if tag:
                     # adjust rev
-                    repo_yaml["rev"] = tag
+                    fix.new_rev = tag
                     comp.fixed = True
+                    fix.complaints.append(comp)
                     is_short_hash = is_full_hash = False
                 else:
                     # fixing failed
@@ -815,11 +1428,6 @@ class Linter:
                 )
             elif is_full_hash and self.enabled(Rule.CHECK_COMMENTED_TAG):
                 # Check the version specified in comment
-                # need full_hash to identify commit
-
-                # determine tags attached to closest commit with a tag
-                tags = await self.get_tags(repo_url, rev)
-
                 if comment_rev not in tags:
                     # wrong version
                     comp = complain(
@@ -832,14 +1440,13 @@ class Linter:
 
             if comp and self.should_fix(comp):  # only true when fixable
                 # select best tag
-                tag = await self.select_best_tag(repo_url, rev)
+                tag = select_best_tag(tags)
 
                 if tag:
                     # adjust comment
-                    repo_yaml.yaml_add_eol_comment(
-                        comment_template.format(rev=tag, note=comment_note), "rev"
-                    )
+                    fix.comment = format_comment(rev=tag, note=comment_note)
                     comp.fixed = True
+                    fix.complaints.append(comp)
                 else:
                     # fixing failed
                     comp.fixable = False
@@ -854,12 +1461,11 @@ class Linter:
 
                 if hash:
                     # adjust rev
-                    repo_yaml["rev"] = hash
+                    fix.new_rev = hash
                     # adjust comment
-                    repo_yaml.yaml_add_eol_comment(
-                        comment_template.format(rev=rev, note=comment_note), "rev"
-                    )
+                    fix.comment = format_comment(rev=rev, note=comment_note)
                     comp.fixed = True
+                    fix.complaints.append(comp)
                 else:
                     # fixing failed
                     comp.fixable = False
@@ -876,13 +1482,13 @@ class Linter:
                     )
 
                     if self.should_fix(comp):
-                        if comment_note:
-                            # adjust comment
-                            repo_yaml.yaml_add_eol_comment(comment_note, "rev")
-                        else:
-                            # remove comment
-                            del repo_yaml.ca.items["rev"]
+                        # adjust or remove comment
+                        fix.comment = comment_note
                         comp.fixed = True
+                        fix.complaints.append(comp)
+
+        if fix.new_rev is not None or fix.comment is not None:
+            self._fixes.setdefault(file, []).append(fix)
 
     async def run(self, content: str, file: str) -> Tuple[str, List[Complaint]]:
         """
@@ -902,11 +1508,7 @@ class Linter:
         """
         # Load file
         try:
-            yaml = YAML()
-            yaml.preserve_quotes = True
-            _, ind, bsi = load_yaml_guess_indent(content)
-            yaml.indent(mapping=bsi, sequence=ind, offset=bsi)
-            config_yaml = yaml.load(content)
+            config_yaml = YAML().load(content)
         except (YAMLError, YAMLWarning) as exc:
             logger.info(f"Invalid YAML in file {file}", exc_info=True)
 
@@ -919,8 +1521,6 @@ class Linter:
 
             return content, self._complains.get(file, [])
 
-        logger.debug(f"Indentation detected: ind={ind} bsi={bsi}")
-
         # config_yaml must be dictionary == mapping at toplevel of config file
         if not isinstance(config_yaml, dict):
             self.complain(
@@ -944,9 +1544,10 @@ class Linter:
             *(self.lint_repo(repos_yaml, i, file) for i in range(len(repos_yaml)))
         )
 
-        stream = StringIO()
-        yaml.dump(config_yaml, stream)
-        return stream.getvalue(), self._complains.get(file, [])
+        fixes = self._fixes.get(file)
+        if fixes:
+            content = apply_fixes(content, fixes)
+        return content, self._complains.get(file, [])
 
 
 pattern_rich_markup_tag = r"(?<!\\)\[.*?\]"
@@ -1047,6 +1648,33 @@ def output(*, colour: bool):
     yield out, console
 
 
+async def process_file(linter: Linter, file: Path) -> Tuple[str, List[Complaint]]:
+    """
+    Read and lint a file.
+
+    The file is read in a separate thread so that multiple files can be
+    read and linted concurrently.
+
+    Parameters
+    ----------
+    linter : Linter
+        The linter to use.
+    file : Path
+        The file to lint.
+
+    Returns
+    -------
+    Tuple[str, List[Complaint]]
+        new contents, list of complaints
+    """
+    logger.info(f"Processing {file}...")
+
+    loop = asyncio.get_running_loop()
+    content = await loop.run_in_executor(None, file.read_text)
+
+    return await linter.run(content, file=str(file))
+
+
 async def main():
     """The main entry point."""
     parser = get_parser()
@@ -1063,7 +1691,7 @@ async def main():
     rules |= set(options.rules)
     rules -= set(options.disable)
 
-    output_template: str = options.format
+    format_complaint = compile_template(options.format)
 
     with output(colour=options.colour) as (out, console):
         if console:
@@ -1086,20 +1714,18 @@ async def main():
                         )
                     found = rule.value
 
-        linter = Linter(rules, set(options.fix))
-
-        futures = []
-        files: List[Path] = []
-        for file in options.files:
-            file = cast(Path, file)
-            logger.info(f"Processing {file}...")
-
-            content = file.read_text()
-
-            files.append(file)
-            futures.append(linter.run(content, file=str(file)))
+        # argparse already converted the arguments to paths
+        files: List[Path] = options.files
+        with tag_cache() as db:
+            linter = Linter(rules, set(options.fix), db)
+            results: list[Tuple[str, List[Complaint]]] = await gather(
+                *(process_file(linter, file) for file in files)
+            )
 
-        results: list[Tuple[str, List[Complaint]]] = await gather(*futures)
+        try:
+            prune_cache()
+        except OSError:
+            logger.exception("Couldn't prune cache.")
 
         rc = 0
         for file, (content, complaints) in zip(files, results):
@@ -1120,7 +1746,7 @@ async def main():
                     else error_str
                 )
                 out(
-                    output_template.format(
+                    format_complaint(
                         file=comp.file,
                         code=comp.type.code,  # type: ignore[attr-defined]
                         msg=comp.message,
@@ -1,7 +1,15 @@
 """Test small stuff that doesn't belong in any of the other files."""
+import asyncio
 import unittest
 
-from check_pre_commit_config_frozen import process_frozen_comment, strip_rich_markup
+from check_pre_commit_config_frozen import (
+    async_cache,
+    compile_template,
+    is_hash,
+    process_frozen_comment,
+    select_best_tag,
+    strip_rich_markup,
+)
 
 
 class GeneralTests(unittest.TestCase):
@@ -23,6 +31,87 @@ class GeneralTests(unittest.TestCase):
             with self.subTest(s=s):
                 self.assertEqual(strip_rich_markup(s), e)
 
+    def test_async_cache(self):
+        """Test the `async_cache` wrapper."""
+        calls = []
+
+        @async_cache()
+        async def calc(value):
+            calls.append(value)
+            await asyncio.sleep(0)
+            if value < 0:
+                raise ValueError(value)
+            return value * 2
+
+        async def run():
+            return await asyncio.gather(calc(1), calc(1), calc(2))
+
+        with self.subTest("Concurrent calls"):
+            self.assertEqual(asyncio.run(run()), [2, 2, 4])
+            self.assertEqual(calls, [1, 2])
+
+        with self.subTest("Cached call"):
+            self.assertEqual(asyncio.run(calc(1)), 2)
+            self.assertEqual(calls, [1, 2])
+
+        with self.subTest("Failed call"):
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    asyncio.run(calc(-1))
+            self.assertEqual(calls, [1, 2, -1, -1])
+
+    def test_compile_template(self):
+        """Test the `compile_template` function."""
+        kwargs = {"a": 1, "b": "text {x} 'quoted' \"quoted\"\n"}
+        templates = [
+            "",
+            "No fields",
+            "{a} and {b}",
+            "\\[{a}] {{escaped}} '\"",
+            "{a:>5}|{a:05d}|{b!r}|{b:.3}",
+            "{a:{a}}",
+            "{a.real}",
+        ]
+
+        for template in templates:
+            with self.subTest(template=template):
+                self.assertEqual(
+                    compile_template(template)(**kwargs), template.format(**kwargs)
+                )
+
+        with self.subTest("Missing field"), self.assertRaises(KeyError):
+            compile_template("{c}")(**kwargs)
+
+        with self.subTest("Cached"):
+            self.assertIs(compile_template("{a}"), compile_template("{a}"))
+
+    def test_is_hash(self):
+        """Test the `is_hash` function."""
+        hashes = ["c4a0b883114b00d8d76b479c820ce7950211c99b", "C4A0B88", "0"]
+        no_hashes = ["", "v4.5.0", "main", "c4a0b88 ", "c4a0b8g", "\u0661\u0662"]
+
+        for rev in hashes:
+            with self.subTest(rev=rev):
+                self.assertTrue(is_hash(rev))
+
+        for rev in no_hashes:
+            with self.subTest(rev=rev):
+                self.assertFalse(is_hash(rev))
+
+    def test_select_best_tag(self):
+        """Test the `select_best_tag` function."""
+        cases = [
+            ([], None),
+            (["latest"], "latest"),
+            (["latest", "v1"], "v1"),
+            (["v1", "v1.0.0", "v1.0"], "v1.0"),
+            (["v1.0", "v2.0"], "v1.0"),
+        ]
+
+        for tags, expected in cases:
+            with self.subTest(tags=tags):
+                self.assertEqual(select_best_tag(tags), expected)
+
     def test_comment(self):
         """Test the `process_frozen_comment` function."""
         frozen_comments = [
@@ -30,6 +119,7 @@ class GeneralTests(unittest.TestCase):
             ("# frozen: rev ", "rev", " "),
             ("# frozen: rev some comment", "rev", " some comment"),
             ("# frozen: rev # some comment", "rev", " # some comment"),
+            ("# frozen: rev  some comment", "rev", "  some comment"),
         ]
         unfrozen_comments = [
             "#frozen: rev",
@@ -47,6 +137,8 @@ class GeneralTests(unittest.TestCase):
             " frozen: rev",
             " frozen: rev # some comment",
             "frozen: rev # some comment",
+            "# frozen: rev\tsome comment",
+            "# frozen: rev\n# some comment",
         ]
 
         for c, expected_rev, expected_note in frozen_comments:
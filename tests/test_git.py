@@ -1 +1,167 @@
 """Test the code calling git."""
+import asyncio
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import check_pre_commit_config_frozen
+from check_pre_commit_config_frozen import (
+    cache_tags,
+    cached_repo,
+    fetch_info,
+    get_cache_dir,
+    get_cached_tags,
+    prune_cache,
+    tag_cache,
+)
+
+
+def git(*args: str, cwd: str) -> str:
+    """Run git in a given directory and return its output."""
+    return subprocess.run(
+        ("git", "-c", "user.name=test", "-c", "user.email=test@test", *args),
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+class RepoTestCase(unittest.TestCase):
+    """A test case providing a local repository as remote."""
+
+    def setUp(self) -> None:
+        """Create a repository with a few commits and tags."""
+        self._tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(
+            os.environ, {"XDG_CACHE_HOME": str(Path(self._tmp.name) / "cache")}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.repo = str(Path(self._tmp.name) / "remote")
+        git("init", "--template=", self.repo, cwd=self._tmp.name)
+
+        self.hashes = []
+        for i in range(3):
+            git("commit", "--allow-empty", "-m", f"Commit {i}", cwd=self.repo)
+            self.hashes.append(git("rev-parse", "HEAD", cwd=self.repo))
+
+        git("tag", "v1", self.hashes[0], cwd=self.repo)
+        git("tag", "v1.0", self.hashes[0], cwd=self.repo)
+        git("tag", "v2.0", self.hashes[1], cwd=self.repo)
+        git("tag", "-a", "-m", "Release", "v2.0.0", self.hashes[1], cwd=self.repo)
+
+    def tearDown(self) -> None:
+        """Remove the repository."""
+        self._tmp.cleanup()
+
+
+class FetchTest(RepoTestCase):
+    """Test retrieving information from a remote repository."""
+
+    def test_fetch_info(self):
+        """Test the `fetch_info` function."""
+        with self.subTest("Tagged commit"):
+            hash, tags = asyncio.run(fetch_info(self.repo, self.hashes[0]))
+            self.assertEqual(hash, self.hashes[0])
+            self.assertEqual(sorted(tags), ["v1", "v1.0"])
+
+        with self.subTest("Untagged commit"):
+            hash, tags = asyncio.run(fetch_info(self.repo, self.hashes[2]))
+            self.assertEqual(hash, self.hashes[2])
+            self.assertEqual(sorted(tags), ["v2.0", "v2.0.0"])
+
+        with self.subTest("Tag"):
+            hash, tags = asyncio.run(fetch_info(self.repo, "v2.0"))
+            self.assertEqual(hash, self.hashes[1])
+            self.assertEqual(sorted(tags), ["v2.0", "v2.0.0"])
+
+        with self.subTest("Without tags"):
+            hash, tags = asyncio.run(fetch_info(self.repo, "v1.0", tags=False))
+            self.assertEqual(hash, self.hashes[0])
+            self.assertEqual(tags, [])
+
+        with self.subTest("Branch"):
+            branch = git("branch", "--show-current", cwd=self.repo)
+            hash, tags = asyncio.run(fetch_info(self.repo, branch))
+            self.assertEqual(hash, self.hashes[2])
+            self.assertEqual(sorted(tags), ["v2.0", "v2.0.0"])
+
+    def test_options(self):
+        """Test that repos and revs aren't passed as options."""
+        marker = Path(self._tmp.name) / "marker"
+        with self.assertRaises(subprocess.CalledProcessError):
+            asyncio.run(fetch_info(self.repo, f"--upload-pack=touch {marker}"))
+        self.assertFalse(marker.exists())
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            asyncio.run(fetch_info(f"--upload-pack=touch {marker}", "v1"))
+        self.assertFalse(marker.exists())
+
+    def test_cache(self):
+        """Test reusing and pruning cached repositories."""
+
+        async def clone(repo):
+            async with cached_repo(repo) as path:
+                return path
+
+        path = asyncio.run(clone(self.repo))
+        self.assertTrue(path.is_dir())
+        self.assertEqual(path.parent, get_cache_dir())
+        self.assertEqual(asyncio.run(clone(self.repo)), path)
+
+        with self.subTest("Keep"):
+            prune_cache()
+            self.assertTrue(path.is_dir())
+
+        with self.subTest("Leftover"):
+            leftover = path.with_name(f"{path.name}.interrupted")
+            leftover.mkdir()
+            prune_cache()
+            self.assertFalse(leftover.exists())
+            self.assertTrue(path.is_dir())
+
+        with self.subTest("Vanishing files"), mock.patch(
+            "os.path.getsize", side_effect=FileNotFoundError
+        ):
+            prune_cache(0)
+            self.assertTrue(path.is_dir())
+
+        with self.subTest("Prune"):
+            prune_cache(0)
+            self.assertFalse(path.exists())
+
+    def test_tag_cache(self):
+        """Test storing tags in the tag cache."""
+        with tag_cache() as db:
+            self.assertIsNotNone(db)
+            self.assertIsNone(get_cached_tags(db, self.repo, self.hashes[0]))
+
+            cache_tags(db, self.repo, self.hashes[0], ["v1", "v1.0"])
+            cache_tags(db, self.repo, self.hashes[2], [])
+            self.assertEqual(
+                get_cached_tags(db, self.repo, self.hashes[0]), ["v1", "v1.0"]
+            )
+            self.assertEqual(get_cached_tags(db, self.repo, self.hashes[2]), [])
+
+            with self.subTest("Expired"), mock.patch.object(
+                check_pre_commit_config_frozen, "TAG_CACHE_EXPIRY", -1
+            ):
+                self.assertIsNone(get_cached_tags(db, self.repo, self.hashes[0]))
+
+            with self.subTest("Evicted"), mock.patch.object(
+                check_pre_commit_config_frozen, "MAX_TAG_CACHE_ENTRIES", 1
+            ):
+                cache_tags(db, self.repo, self.hashes[1], ["v2.0"])
+                self.assertIsNone(get_cached_tags(db, self.repo, self.hashes[0]))
+                self.assertEqual(
+                    get_cached_tags(db, self.repo, self.hashes[1]), ["v2.0"]
+                )
+
+        with self.subTest("Reopened"), tag_cache() as db:
+            self.assertIsNotNone(db)
+            self.assertEqual(get_cached_tags(db, self.repo, self.hashes[1]), ["v2.0"])
@@ -1,7 +1,23 @@
 """Test the linter."""
+import asyncio
 import unittest
+from typing import List, Tuple
+from unittest import mock
 
-from check_pre_commit_config_frozen import Complaint, Linter, Rule
+import check_pre_commit_config_frozen
+from check_pre_commit_config_frozen import (
+    Complaint,
+    Linter,
+    RevFix,
+    Rule,
+    apply_fixes,
+    cache_tags,
+    fetch_info,
+    get_cached_tags,
+    tag_cache,
+)
+
+from .test_git import RepoTestCase, git
 
 
 class ComplainTest(unittest.TestCase):
@@ -16,9 +32,7 @@ class GeneralTest(unittest.TestCase):
     def setUp(self) -> None:
         """Prepare some rules and corrensponding complaints."""
         self.rule1 = Rule.FORCE_FREEZE
-        self.rule1.template = ""
         self.rule2 = Rule.FORCE_UNFREEZE
-        self.rule2.template = ""
         self.complaint1 = Complaint("", 0, 0, self.rule1, "", True)
         self.complaint2 = Complaint("", 0, 0, self.rule2, "", True)
 
@@ -65,15 +79,268 @@ class GeneralTest(unittest.TestCase):
 
         self.assertDictEqual(linter._complains, {})
 
-        linter.complain("", self.rule2, 0, 0, False)
+        linter.complain("", self.rule2, 0, 0, False, rev="")
 
         self.assertDictEqual(linter._complains, {})
 
-        linter.complain("", self.rule1, 0, 0, False)
+        linter.complain("", self.rule1, 0, 0, False, rev="")
 
         self.assertIn("", linter._complains)
         self.assertEqual(len(linter._complains[""]), 1)
 
         # test adding to existing complains
-        linter.complain("", self.rule1, 0, 0, False)
+        linter.complain("", self.rule1, 0, 0, False, rev="")
         self.assertEqual(len(linter._complains[""]), 2)
+
+
+class FixTest(unittest.TestCase):
+    """Test applying fixes to the file contents."""
+
+    def test_apply_fixes(self):
+        """Test the `apply_fixes` function."""
+        cases = [
+            (
+                "rev: v1\n",
+                RevFix(0, 5, "v1", new_rev="abc", comment="frozen: v1"),
+                "rev: abc  # frozen: v1\n",
+            ),
+            (
+                "rev: 'v1'   # old\r\nnext: 1",
+                RevFix(0, 5, "v1", "abc", "frozen: v1", 0, 12, 0),
+                "rev: 'abc'   # frozen: v1\r\nnext: 1",
+            ),
+            (
+                'rev: "v1" # frozen: v0 note\n',
+                RevFix(0, 5, "v1", None, " note", 0, 10, 0),
+                'rev: "v1" # note\n',
+            ),
+            (
+                "rev: v1  # frozen: v0\n",
+                RevFix(0, 5, "v1", None, "", 0, 9, 0),
+                "rev: v1\n",
+            ),
+            (
+                "rev: v1\n  # frozen: v0\n  #  note\n\nnext: 1\n",
+                RevFix(0, 5, "v1", None, "frozen: v2", 1, 2, 2),
+                "rev: v1  # frozen: v2\n\nnext: 1\n",
+            ),
+            (
+                "rev: &a !!str v1\n",
+                RevFix(0, 5, "v1", new_rev="abc"),
+                "rev: &a !!str abc\n",
+            ),
+            (
+                "- {repo: r, rev: v1, hooks: []}\n",
+                RevFix(0, 17, "v1", new_rev="abc"),
+                "- {repo: r, rev: abc, hooks: []}\n",
+            ),
+            (
+                "rev: v1\n",
+                RevFix(0, 5, "v2", new_rev="abc"),
+                "rev: v1\n",
+            ),
+        ]
+
+        for content, fix, expected in cases:
+            with self.subTest(content=content, fix=fix):
+                self.assertEqual(apply_fixes(content, [fix]), expected)
+
+        with self.subTest("Unlocatable"):
+            comp = Complaint("", 0, 5, Rule.FORCE_FREEZE, "", True, True)
+            fix = RevFix(0, 5, "v1", new_rev="abc", complaints=[comp])
+            self.assertEqual(apply_fixes("rev: >-\n  v1\n", [fix]), "rev: >-\n  v1\n")
+            self.assertFalse(comp.fixed)
+            self.assertFalse(comp.fixable)
+
+
+class RunTest(RepoTestCase):
+    """Test linting and fixing files."""
+
+    def setUp(self) -> None:
+        """Create a repository with a few commits and tags."""
+        super().setUp()
+        self.values = {
+            "repo": self.repo,
+            "branch": git("branch", "--show-current", cwd=self.repo),
+            "h0": self.hashes[0],
+            "h1": self.hashes[1],
+            "h2": self.hashes[2],
+        }
+
+    def lint(
+        self, content: str, rules: str, fix: str = "", **kwargs
+    ) -> Tuple[str, List[Complaint]]:
+        """Lint and fix a file with the given rules."""
+        linter = Linter(set(rules), set(fix), **kwargs)
+        return asyncio.run(linter.run(content, "file"))
+
+    def test_fix(self):
+        """Test fixing files and linting the result again."""
+        # the rules to fix, the rules to lint the result with, content, expected
+        cases = [
+            (
+                "e",
+                "ycaeu",
+                "  - repo: {repo}\n    rev: v1  # frozen: v1 note\n",
+                "  - repo: {repo}\n    rev: v1  # note\n",
+            ),
+            (
+                "e",
+                "ycaeu",
+                "  - repo: {repo}\n    rev: v1\n    # frozen: v1\n    hooks: []\n",
+                "  - repo: {repo}\n    rev: v1\n    hooks: []\n",
+            ),
+            (
+                "e",
+                "ycaeu",
+                "  - repo: {repo}\n    rev: 'v1'\n\n  # frozen: v1\n  - repo: meta\n",
+                "  - repo: {repo}\n    rev: 'v1'\n\n  - repo: meta\n",
+            ),
+            (
+                "mt",
+                "ycafmt",
+                "  - repo: {repo}\n    rev: {h0}  # frozen: v0.8\n",
+                "  - repo: {repo}\n    rev: {h0}  # frozen: v1.0\n",
+            ),
+            (
+                "mt",
+                "ycafmt",
+                "  - repo: {repo}\n    rev: {h0}\n    # frozen: v0.8 note\n",
+                "  - repo: {repo}\n    rev: {h0}  # frozen: v1.0 note\n",
+            ),
+            (
+                "mt",
+                "ycafmt",
+                '  - repo: {repo}\n    rev: "{h1}"\n    hooks: []\n',
+                '  - repo: {repo}\n    rev: "{h1}"  # frozen: v2.0\n    hooks: []\n',
+            ),
+            (
+                "mt",
+                "ycafmt",
+                "  - repo: {repo}\n    rev: &a {h2}\n",
+                "  - repo: {repo}\n    rev: &a {h2}  # frozen: v2.0\n",
+            ),
+            (
+                "f",
+                "ycafm",
+                "  - repo: {repo}\n    rev: {branch}\n    # frozen: v1\n",
+                "  - repo: {repo}\n    rev: {h2}  # frozen: {branch}\n",
+            ),
+            (
+                "f",
+                "ycafmt",
+                "  - repo: {repo}\n    rev: 'v1.0'  # frozen: v1 note\n",
+                "  - repo: {repo}\n    rev: '{h0}'  # frozen: v1.0 note\n",
+            ),
+            (
+                "f",
+                "ycafmt",
+                "  - repo: {repo}\n    rev: &a v1\n",
+                "  - repo: {repo}\n    rev: &a {h0}  # frozen: v1\n",
+            ),
+            (
+                "u",
+                "ycau",
+                "  - repo: {repo}\n    rev: {h0}  # frozen: v1\n",
+                "  - repo: {repo}\n    rev: v1.0  # frozen: v1\n",
+            ),
+            (
+                "u",
+                "ycaeu",
+                "  - {{repo: {repo}, rev: '{h1}'}}\n",
+                "  - {{repo: {repo}, rev: 'v2.0'}}\n",
+            ),
+        ]
+
+        for fix, rules, content_template, expected_template in cases:
+            content = "repos:\n" + content_template.format(**self.values)
+            expected = "repos:\n" + expected_template.format(**self.values)
+            with self.subTest(fix=fix, content=content):
+                fixed, complaints = self.lint(content, fix, fix)
+                self.assertEqual(fixed, expected)
+                self.assertTrue(complaints)
+                self.assertTrue(all(c.fixed for c in complaints))
+
+                self.assertEqual(self.lint(fixed, rules, rules), (fixed, []))
+
+    def test_unfixable(self):
+        """Test reporting values that cannot be changed."""
+        cases = [
+            ("f", "repos:\n  - repo: {repo}\n    rev: >-\n      v1\n"),
+            ("f", "repos:\n  - {{repo: {repo}, rev: v2.0, hooks: []}}\n"),
+            ("f", "repos:\n  - {{repo: {repo}, rev: v1.0,\n     hooks: []}}\n"),
+            ("f", "repos: [{{repo: {repo}, rev: v1}}, {{repo: {repo}, rev: v1}}]\n"),
+            ("m", "repos:\n  - {{repo: {repo}, rev: {h1}}}  # v2.0\n"),
+        ]
+
+        for fix, content_template in cases:
+            content = content_template.format(**self.values)
+            with self.subTest(fix=fix, content=content):
+                fixed, complaints = self.lint(content, fix, fix)
+                self.assertEqual(fixed, content)
+                self.assertTrue(complaints)
+                for comp in complaints:
+                    self.assertFalse(comp.fixed)
+                    self.assertFalse(comp.fixable)
+
+    def test_lookup_once(self):
+        """Test looking up a repo and rev used multiple times only once."""
+        content = "repos:\n" + 2 * "  - repo: {repo}\n    rev: v1\n"
+        content = content.format(**self.values)
+
+        async def run(linter):
+            return await asyncio.gather(
+                linter.run(content, "file1"), linter.run(content, "file2")
+            )
+
+        with mock.patch.object(
+            check_pre_commit_config_frozen, "fetch_info", wraps=fetch_info
+        ) as mocked:
+            results = asyncio.run(run(Linter(set("f"), set("f"))))
+            self.assertEqual(mocked.call_count, 1)
+
+        for fixed, complaints in results:
+            self.assertEqual(fixed.count(self.hashes[0]), 2)
+            self.assertEqual(len(complaints), 2)
+
+    def test_tag_cache(self):
+        """Test using the tag cache for full hashes."""
+        content = "repos:\n  - repo: {repo}\n    rev: {rev}  # frozen: {tag}\n"
+
+        with tag_cache() as db, mock.patch.object(
+            check_pre_commit_config_frozen, "fetch_info", wraps=fetch_info
+        ) as mocked:
+            self.assertIsNotNone(db)
+
+            with self.subTest("Hash lookup"):
+                self.lint(
+                    content.format(repo=self.repo, rev="v2.0", tag="v2.0"),
+                    "f",
+                    "f",
+                    tag_cache=db,
+                )
+                self.assertEqual(mocked.call_count, 1)
+                self.assertIsNone(get_cached_tags(db, self.repo, self.hashes[1]))
+
+            with self.subTest("Store"):
+                _, complaints = self.lint(
+                    content.format(repo=self.repo, rev=self.hashes[1], tag="v2.0"),
+                    "t",
+                    tag_cache=db,
+                )
+                self.assertEqual(complaints, [])
+                self.assertEqual(mocked.call_count, 2)
+                self.assertEqual(
+                    sorted(get_cached_tags(db, self.repo, self.hashes[1]) or []),
+                    ["v2.0", "v2.0.0"],
+                )
+
+            with self.subTest("Cached"):
+                cache_tags(db, self.repo, self.hashes[0], ["cached"])
+                _, complaints = self.lint(
+                    content.format(repo=self.repo, rev=self.hashes[0], tag="cached"),
+                    "t",
+                    tag_cache=db,
+                )
+                self.assertEqual(complaints, [])
+                self.assertEqual(mocked.call_count, 2)